@@ -6,6 +6,7 @@ from datetime import datetime, timedelta
 import openpyxl
 import xlrd
 import calendar
+import functools
 import io
 import sqlite3
 import bcrypt
@@ -13,26 +14,127 @@ import re
 import secrets
 import string
 import smtplib
+import unicodedata
+import difflib
+import json
+import queue
+import threading
+from collections import defaultdict
 from email.mime.text import MIMEText
 
+class EmployeeMatcher:
+    """Maps names found in attendance sheets to employee records; build one per ingestion run."""
+
+    def __init__(self, employees, ngram_size=3, threshold=0.9, margin=0.05, max_candidates=5):
+        self.employees = employees
+        self.ngram_size = ngram_size
+        self.threshold = threshold
+        # A fuzzy hit must beat the best other employee by this much, or two people could be confused.
+        self.margin = margin
+        self.max_candidates = max_candidates
+        self.exact = {}
+        self.compact = {}
+        self.initials = {}
+        self.keys = []
+        self.ngram_index = defaultdict(list)
+        self.cache = {}
+        self.report = {"exact": {}, "auto_matched": {}, "unmatched": set()}
+        for name in employees:
+            key = self.normalize(name)
+            if not key:
+                continue
+            self.exact.setdefault(key, name)
+            self.compact.setdefault(key.replace(' ', ''), name)
+            initials_key = self.initials_key(key)
+            # An initials form shared by two employees is ambiguous and never auto-matched.
+            self.initials[initials_key] = name if initials_key not in self.initials else None
+            key_id = len(self.keys)
+            self.keys.append((key, name))
+            for gram in set(self.ngrams(key)):
+                self.ngram_index[gram].append(key_id)
+
+    def normalize(self, name):
+        name = unicodedata.normalize('NFKD', str(name)).casefold()
+        name = re.sub(r'[^\w\s]|_', ' ', name)
+        return ' '.join(name.split())
+
+    def initials_key(self, key):
+        tokens = key.split()
+        return ' '.join([token[0] for token in tokens[:-1]] + tokens[-1:])
+
+    def ngrams(self, key):
+        padded = f" {key} "
+        return [padded[i:i + self.ngram_size] for i in range(max(len(padded) - self.ngram_size + 1, 1))]
+
+    def match(self, sheet_name):
+        """Return the employee name for sheet_name, or None, recording the outcome in self.report."""
+        key = self.normalize(sheet_name)
+        if key not in self.cache:
+            self.cache[key] = self.lookup(key)
+        emp_name, score, method = self.cache[key]
+        if emp_name is None:
+            self.report["unmatched"].add(sheet_name)
+        elif sheet_name == emp_name:
+            self.report["exact"][sheet_name] = emp_name
+        else:
+            self.report["auto_matched"][sheet_name] = (emp_name, score, method)
+        return emp_name
+
+    def lookup(self, key):
+        """Return (employee name, score, method); score is None for initials hits, which have no similarity score."""
+        if not key:
+            return None, None, None
+        if key in self.exact:
+            return self.exact[key], 1.0, "normalized"
+        if key.replace(' ', '') in self.compact:
+            return self.compact[key.replace(' ', '')], 1.0, "normalized"
+        initials_key = self.initials_key(key)
+        if initials_key == key and self.initials.get(key):
+            return self.initials[key], None, "initials"
+        shared = defaultdict(int)
+        for gram in set(self.ngrams(key)):
+            for key_id in self.ngram_index.get(gram, ()):
+                shared[key_id] += 1
+        candidates = sorted(shared, key=shared.get, reverse=True)[:self.max_candidates]
+        scored = sorted(((difflib.SequenceMatcher(None, key, self.keys[key_id][0]).ratio(), self.keys[key_id][1])
+                         for key_id in candidates), reverse=True)
+        if not scored or scored[0][0] < self.threshold:
+            return None, None, None
+        runner_up = next((score for score, name in scored[1:] if name != scored[0][1]), 0.0)
+        if scored[0][0] - runner_up < self.margin:
+            return None, None, None
+        return scored[0][1], round(scored[0][0], 3), "fuzzy"
+
 class DataManager:
     """Handles data operations including SQLite and file processing."""
     
-    def __init__(self):
-        self.conn = None
-
     def init_db(self):
-        self.conn = sqlite3.connect('hr_data.db')
-        c = self.conn.cursor()
+        # A local connection per call: the ingestion worker and session threads share one DataManager.
+        conn = sqlite3.connect('hr_data.db')
+        c = conn.cursor()
+        # WAL lets the UI keep reading while the ingestion worker writes.
+        c.execute("PRAGMA journal_mode=WAL")
         c.execute('''CREATE TABLE IF NOT EXISTS employees
                      (employee_id TEXT PRIMARY KEY, name TEXT UNIQUE, email TEXT, mobile TEXT, designation TEXT, 
                       bank_name TEXT, account_number TEXT, ifsc TEXT, monthly_salary REAL)''')
         c.execute('''CREATE TABLE IF NOT EXISTS attendance
                      (emp_id TEXT, att_date TEXT, in_time TEXT, out_time TEXT, total_hours TEXT, status TEXT, 
                       salary REAL, remark TEXT, day TEXT, PRIMARY KEY (emp_id, att_date))''')
+        c.execute("CREATE INDEX IF NOT EXISTS idx_employees_name_nocase ON employees (name COLLATE NOCASE)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_employees_id_nocase ON employees (employee_id COLLATE NOCASE)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_employees_designation ON employees (designation)")
+        c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'payroll_totals'")
+        if c.fetchone() is None:
+            c.execute('''CREATE TABLE payroll_totals
+                         (emp_id TEXT, month TEXT, total_salary REAL, PRIMARY KEY (emp_id, month))''')
+            self.refresh_payroll_totals(c)
+        c.execute('''CREATE TABLE IF NOT EXISTS jobs
+                     (job_id INTEGER PRIMARY KEY AUTOINCREMENT, status TEXT, progress REAL, message TEXT,
+                      params TEXT, report TEXT, created_at TEXT, updated_at TEXT)''')
         c.execute('''CREATE TABLE IF NOT EXISTS users
                      (username TEXT PRIMARY KEY, hashed_password TEXT, email TEXT, is_temp INTEGER DEFAULT 0)''')
-        self.conn.commit()
+        conn.commit()
+        conn.close()
 
     def time_to_str(self, time_val):
         if pd.isna(time_val) or str(time_val).strip() in ['--:--', '']:
@@ -101,7 +203,7 @@ class DataManager:
                         cell = str(cell).strip()
                         if 'To' in cell:
                             date_str = cell.split(' To ')[0].strip()
-                            date_obj = pd.to_datetime(date_str, errors='coerce')
+                            date_obj = pd.to_datetime(date_str, dayfirst=True, errors='coerce')
                             if not pd.isna(date_obj):
                                 return date_obj.strftime('%m/%Y')
             else:
@@ -111,13 +213,13 @@ class DataManager:
                     for cell in row_4:
                         if 'To' in cell:
                             date_str = cell.split(' To ')[0].strip()
-                            date_obj = pd.to_datetime(date_str, errors='coerce')
+                            date_obj = pd.to_datetime(date_str, dayfirst=True, errors='coerce')
                             if not pd.isna(date_obj):
                                 return date_obj.strftime('%m/%Y')
-            return "07/2025"
+            return None
         except Exception as e:
             print(f"Error extracting month/year from {file_path}: {e}")
-            return "07/2025"
+            return None
 
     def find_column_indices(self, df, header_row, file_type):
         headers = df.iloc[header_row].astype(str).str.strip().str.lower()
@@ -147,13 +249,16 @@ class DataManager:
                 raise KeyError(f"Row {header_row + 1} does not have enough columns")
         return col_mapping
 
+    # Fraction of the daily salary paid per status; anything else is unpaid.
+    SALARY_FACTORS = {"Full day": 1, "WFH": 1, "Half day": 0.5}
+
+    # att_date is stored as YYYY-DD-MM; these derive the payroll month and its length in SQL.
+    ATT_MONTH_SQL = "substr(att_date, 9, 2) || '/' || substr(att_date, 1, 4)"
+    ATT_DAYS_IN_MONTH_SQL = ("CAST(strftime('%d', substr(att_date, 1, 4) || '-' || substr(att_date, 9, 2) || '-01', "
+                             "'+1 month', '-1 day') AS INTEGER)")
+
     def calculate_salary(self, status, daily_salary):
-        if status in ["Full day", "WFH"]:
-            return daily_salary
-        elif status == "Half day":
-            return daily_salary / 2
-        else:
-            return 0
+        return daily_salary * self.SALARY_FACTORS.get(status, 0)
 
     def get_latest_date(self, df, file_type, header_row):
         try:
@@ -167,20 +272,60 @@ class DataManager:
         except Exception:
             return None
 
-    def process_excel_file(self, df, file_path, json_data, file_type, employees, start_date, end_date, days_in_month):
+    # Order in which uploads win a conflict under the "source_priority" strategy.
+    SOURCE_PRIORITY = ["altius_current", "monthinout_current", "altius_prev", "monthinout_prev"]
+    MERGE_STRATEGIES = {"first_in_last_out": "First in / last out across branches",
+                        "source_priority": "Current month files win"}
+
+    def time_to_minutes(self, time_val):
+        if time_val is None:
+            return None
+        try:
+            hours, minutes = str(time_val).split(':')[:2]
+            return int(hours) * 60 + int(minutes)
+        except (ValueError, TypeError):
+            return None
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def month_calendar(year, month):
+        """Return (days_in_month, dates) for a payroll month, computed once per month."""
+        days_in_month = calendar.monthrange(year, month)[1]
+        return days_in_month, tuple(datetime(year, month, day) for day in range(1, days_in_month + 1))
+
+    def find_name_rows(self, df, file_type):
         identifier_col = 3 if file_type == "altius" else 7
         identifier = "Employee Name :" if file_type == "altius" else "Name"
+        return df[df[identifier_col].astype(str).str.strip() == identifier].index
+
+    def detect_period(self, df, file_path, file_type):
+        """Return (month "MM/YYYY", latest attendance date) for a workbook; either may be None."""
+        name_rows = self.find_name_rows(df, file_type)
+        latest_date = self.get_latest_date(df, file_type, name_rows[0] + 1) if len(name_rows) else None
+        month = self.extract_month_year(df, file_path)
+        # The header names the payroll month; exports often spill into the next month, so dates are only a fallback.
+        if month is None and latest_date is not None:
+            month = latest_date.strftime('%m/%Y')
+        return month, latest_date
+
+    def extract_attendance_rows(self, df, file_type, source, matcher, start_date=None, end_date=None):
+        """Collect (emp_id, date, source_rank, name, in_time, out_time) rows from one sheet without resolving conflicts.
+
+        Rows outside start_date..end_date are dropped; a missing bound leaves that side open.
+        """
+        rows = []
+        source_rank = self.SOURCE_PRIORITY.index(source) if source in self.SOURCE_PRIORITY else len(self.SOURCE_PRIORITY)
         name_col = 7 if file_type == "altius" else 9
-        name_rows = df[df[identifier_col].astype(str).str.strip() == identifier].index
+        name_rows = self.find_name_rows(df, file_type)
+        values = df.values
         for name_row in name_rows:
-            emp_name = str(df.iloc[name_row, name_col]).strip()
-            if not emp_name or emp_name == 'nan':
+            sheet_name = str(df.iloc[name_row, name_col]).strip()
+            if not sheet_name or sheet_name == 'nan':
                 continue
-            emp_id = next((data['employee_id'] for name, data in employees.items() if name == emp_name), None)
-            if not emp_id:
+            emp_name = matcher.match(sheet_name)
+            if not emp_name:
                 continue
-            if emp_id not in json_data["Employee ID"]:
-                json_data["Employee ID"][emp_id] = {"name": emp_name, "date": {}, "total_salary": 0}
+            emp_id = matcher.employees[emp_name]['employee_id']
             header_row = name_row + 1
             try:
                 col_mapping = self.find_column_indices(df, header_row, file_type)
@@ -191,45 +336,69 @@ class DataManager:
             date_key = 'Att. Date' if file_type == "altius" else 'Date'
             in_key = 'InTime' if file_type == "altius" else 'IN'
             out_key = 'OutTime' if file_type == "altius" else 'Out'
-            daily_salary = employees.get(emp_name, {}).get("monthly_salary", 0) / days_in_month
-            total_salary = 0
             for row_idx in range(start_row, end_row):
-                row = df.iloc[row_idx]
+                row = values[row_idx]
                 att_date_val = row[col_mapping[date_key]]
                 if pd.isna(att_date_val):
                     continue
                 try:
                     date_obj = pd.to_datetime(att_date_val, dayfirst=True)
-                    att_date = date_obj.strftime('%Y-%d-%m')
-                    date_obj = datetime.strptime(att_date, '%Y-%d-%m')
-                    if not (start_date <= date_obj <= end_date):
+                    date_obj = datetime(date_obj.year, date_obj.month, date_obj.day)
+                    if (start_date and date_obj < start_date) or (end_date and date_obj > end_date):
                         continue
-                    day_of_week = date_obj.strftime('%A')
                 except Exception:
                     continue
-                if date_obj.weekday() == 6:
-                    total_hours = "00:00"
-                    in_time = None
-                    out_time = None
-                    status = "Full day"
-                    salary = self.calculate_salary(status, daily_salary)
-                else:
-                    in_time = self.time_to_str(row[col_mapping[in_key]])
-                    out_time = self.time_to_str(row[col_mapping[out_key]])
-                    total_hours = self.calculate_total_hours(in_time, out_time)
-                    status = self.determine_status(total_hours, att_date)
-                    salary = self.calculate_salary(status, daily_salary)
-                json_data["Employee ID"][emp_id]["date"][att_date] = {
-                    "In Time": in_time,
-                    "Out Time": out_time,
-                    "Total hours": total_hours,
-                    "Status": status,
-                    "Salary": salary,
-                    "Remark": "",
-                    "Day": day_of_week
-                }
-                total_salary += salary
-            json_data["Employee ID"][emp_id]["total_salary"] += total_salary
+                in_time = self.time_to_str(row[col_mapping[in_key]])
+                out_time = self.time_to_str(row[col_mapping[out_key]])
+                rows.append((emp_id, date_obj, source_rank, emp_name, in_time, out_time))
+        return rows
+
+    def merge_attendance_rows(self, rows, json_data, employees, days_in_month, precedence="first_in_last_out"):
+        """Resolve overlapping rows in one pass over (emp_id, date) order, then rebuild totals from the merged days."""
+        if precedence not in self.MERGE_STRATEGIES:
+            raise ValueError(f"Unknown merge precedence: {precedence}")
+        rows = sorted(rows, key=lambda r: (r[0], r[1], r[2]))
+        merged = []
+        for emp_id, date_obj, _, emp_name, in_time, out_time in rows:
+            if merged and merged[-1][0] == emp_id and merged[-1][1] == date_obj:
+                current = merged[-1]
+                if precedence == "source_priority":
+                    # Rows are ordered by source rank, so the first one seen for the day wins.
+                    continue
+                in_minutes = self.time_to_minutes(in_time)
+                current_in = self.time_to_minutes(current[3])
+                if in_minutes is not None and (current_in is None or in_minutes < current_in):
+                    current[3] = in_time
+                out_minutes = self.time_to_minutes(out_time)
+                current_out = self.time_to_minutes(current[4])
+                if out_minutes is not None and (current_out is None or out_minutes > current_out):
+                    current[4] = out_time
+            else:
+                merged.append([emp_id, date_obj, emp_name, in_time, out_time])
+        for emp_id, date_obj, emp_name, in_time, out_time in merged:
+            if emp_id not in json_data["Employee ID"]:
+                json_data["Employee ID"][emp_id] = {"name": emp_name, "date": {}, "total_salary": 0}
+            daily_salary = employees.get(emp_name, {}).get("monthly_salary", 0) / days_in_month
+            att_date = date_obj.strftime('%Y-%d-%m')
+            if date_obj.weekday() == 6:
+                in_time = None
+                out_time = None
+                total_hours = "00:00"
+                status = "Full day"
+            else:
+                total_hours = self.calculate_total_hours(in_time, out_time)
+                status = self.determine_status(total_hours, att_date)
+            json_data["Employee ID"][emp_id]["date"][att_date] = {
+                "In Time": in_time,
+                "Out Time": out_time,
+                "Total hours": total_hours,
+                "Status": status,
+                "Salary": self.calculate_salary(status, daily_salary),
+                "Remark": "",
+                "Day": date_obj.strftime('%A')
+            }
+        for emp_data in json_data["Employee ID"].values():
+            emp_data["total_salary"] = sum(att["Salary"] for att in emp_data["date"].values())
 
     def fill_missing_dates(self, json_data, start_date, end_date, employees, days_in_month):
         delta = end_date - start_date
@@ -250,6 +419,82 @@ class DataManager:
                         "Day": date.strftime('%A')
                     }
 
+    def ingest_files(self, files, employees, precedence="first_in_last_out", progress=None, period=None):
+        """Read, match and merge uploaded workbooks, one payroll month at a time.
+
+        files is a list of {"source", "name", "path"} dicts; progress, if given, is called with the
+        fraction of files read. Months come from each workbook's report month (or latest date);
+        previous-month uploads only contribute overlap rows unless no current-month file was given.
+        period, a (start_date, end_date) pair, overrides detection. Returns (json_data, months, report)
+        and leaves persisting to the caller.
+        """
+        start_override, end_override = period or (None, None)
+        rows = []
+        errors = []
+        detected = {}
+        matcher = EmployeeMatcher(employees)
+        for processed, file in enumerate(files, start=1):
+            try:
+                engine = 'xlrd' if file["path"].endswith('.xls') else 'openpyxl'
+                df = pd.read_excel(file["path"], engine=engine, header=None)
+                file_type = file["source"].split('_')[0]
+                month, latest_date = self.detect_period(df, file["path"], file_type)
+                if month is not None:
+                    detected.setdefault(month, []).append((file["source"], latest_date))
+                rows.extend(self.extract_attendance_rows(df, file_type, file["source"], matcher, start_override, end_override))
+            except Exception as e:
+                errors.append(f"Failed to process {file['name']}: {e}")
+            if progress:
+                progress(processed / len(files))
+
+        months = {}
+        if period:
+            month_start = start_override.replace(day=1)
+            while month_start <= end_override:
+                months[month_start.strftime('%m/%Y')] = None
+                month_start = (month_start + timedelta(days=32)).replace(day=1)
+        else:
+            current = {month for month, sources in detected.items() if any(source.endswith('_current') for source, _ in sources)}
+            for month in current or detected:
+                latest = [latest_date for _, latest_date in detected[month]
+                          if latest_date is not None and latest_date.strftime('%m/%Y') == month]
+                months[month] = datetime(max(latest).year, max(latest).month, max(latest).day) if latest else None
+
+        rows_by_month = defaultdict(list)
+        for row in rows:
+            rows_by_month[row[1].strftime('%m/%Y')].append(row)
+        json_data = {"Month/year": None, "Employee ID": {}}
+        periods = []
+        for month in sorted(set(rows_by_month) - set(months), key=lambda month: (month[3:], month[:2])):
+            errors.append(f"{len(rows_by_month[month])} attendance row(s) dated {month} are outside the payroll months "
+                          f"processed and were ignored")
+        for month in [month for month in months if not rows_by_month[month]]:
+            # Never wipe a saved month because its workbook had no usable rows.
+            errors.append(f"No attendance rows found for {month}; it was left unchanged")
+            del months[month]
+        for month, latest_date in sorted(months.items(), key=lambda item: (item[0][3:], item[0][:2])):
+            month_num, year = map(int, month.split('/'))
+            days_in_month, dates = self.month_calendar(year, month_num)
+            start_date = max(dates[0], start_override) if start_override else dates[0]
+            end_date = min(dates[-1], end_override) if end_override else (latest_date or dates[-1])
+            month_data = {"Month/year": month, "Employee ID": {}}
+            self.merge_attendance_rows(rows_by_month[month], month_data, employees, days_in_month, precedence)
+            self.fill_missing_dates(month_data, start_date, end_date, employees, days_in_month)
+            for emp_id, emp_data in month_data["Employee ID"].items():
+                merged = json_data["Employee ID"].setdefault(emp_id, {"name": emp_data["name"], "date": {}, "total_salary": 0})
+                merged["date"].update(emp_data["date"])
+                merged["total_salary"] += emp_data["total_salary"]
+            json_data["Month/year"] = month
+            periods.append(f"{month} ({start_date.strftime('%Y-%d-%m')} to {end_date.strftime('%Y-%d-%m')})")
+        report = {
+            "exact": matcher.report["exact"],
+            "auto_matched": matcher.report["auto_matched"],
+            "unmatched": sorted(matcher.report["unmatched"]),
+            "errors": errors,
+            "period": ", ".join(periods) or "no payroll month detected"
+        }
+        return json_data, list(months), report
+
     def load_employees(self):
         self.init_db()
         conn = sqlite3.connect('hr_data.db')
@@ -283,12 +528,103 @@ class DataManager:
         conn.commit()
         conn.close()
 
-    def load_attendance(self):
+    # Employee table columns as shown in the UI, mapped to the SQL columns they sort on.
+    EMPLOYEE_COLUMNS = {"ID": "employee_id", "Name": "name", "Email": "email", "Mobile": "mobile",
+                        "Designation": "designation", "Bank Name": "bank_name", "Account": "account_number",
+                        "IFSC": "ifsc", "Monthly Salary": "monthly_salary"}
+
+    def get_employee(self, emp_id):
+        """Return (name, record) for one employee straight from the database, or None."""
+        self.init_db()
+        conn = sqlite3.connect('hr_data.db')
+        conn.row_factory = sqlite3.Row
+        row = conn.execute("SELECT * FROM employees WHERE employee_id = ?", (emp_id,)).fetchone()
+        conn.close()
+        if row is None:
+            return None
+        record = dict(row)
+        return record.pop("name"), record
+
+    def employee_filter(self, search):
+        if not search:
+            return "", []
+        pattern = f"%{search.strip()}%"
+        return " WHERE name LIKE ? OR employee_id LIKE ? OR email LIKE ? OR designation LIKE ?", [pattern] * 4
+
+    def count_employees(self, search=""):
+        self.init_db()
+        conn = sqlite3.connect('hr_data.db')
+        where, params = self.employee_filter(search)
+        total = conn.execute(f"SELECT COUNT(*) FROM employees{where}", params).fetchone()[0]
+        conn.close()
+        return total
+
+    def query_employees(self, search="", sort_by="ID", descending=False, limit=25, offset=0):
+        """Return one page of the employee table, filtered and sorted in SQL."""
+        if sort_by not in self.EMPLOYEE_COLUMNS:
+            raise ValueError(f"Cannot sort employees by {sort_by}")
         self.init_db()
         conn = sqlite3.connect('hr_data.db')
-        df = pd.read_sql_query("SELECT * FROM attendance", conn)
+        where, params = self.employee_filter(search)
+        columns = ", ".join(f'{column} AS "{label}"' for label, column in self.EMPLOYEE_COLUMNS.items())
+        order = f"{self.EMPLOYEE_COLUMNS[sort_by]} {'DESC' if descending else 'ASC'}, employee_id"
+        df = pd.read_sql_query(f"SELECT {columns} FROM employees{where} ORDER BY {order} LIMIT ? OFFSET ?",
+                               conn, params=params + [limit, offset])
         conn.close()
-        attendance = {"Month/year": "07/2025", "Employee ID": {}}
+        return df
+
+    def search_employees(self, text, limit=20):
+        """Type-ahead lookup: "EMP001 - Name" options whose name or ID starts with text, served from the NOCASE indexes."""
+        self.init_db()
+        conn = sqlite3.connect('hr_data.db')
+        pattern = f"{text.strip()}%"
+        rows = conn.execute('''SELECT employee_id, name FROM employees
+                                WHERE name LIKE ? OR employee_id LIKE ?
+                                ORDER BY name COLLATE NOCASE LIMIT ?''', (pattern, pattern, limit)).fetchall()
+        conn.close()
+        return [f"{emp_id} - {name}" for emp_id, name in rows]
+
+    def summarize_payroll(self, group_by="employee", top_n=20, band_width=25000, month=None):
+        """Aggregate one month's payroll totals (all months if month is None) for charting:
+        top-N employees, or totals per designation or salary band."""
+        self.init_db()
+        conn = sqlite3.connect('hr_data.db')
+        month_where, month_params = self.payroll_scope(None, [month] if month else None, "p.month")
+        if group_by == "employee":
+            query = f'''SELECT COALESCE(e.name, p.emp_id) AS label, SUM(p.total_salary) AS total_salary
+                       FROM payroll_totals p LEFT JOIN employees e ON e.employee_id = p.emp_id{month_where}
+                       GROUP BY p.emp_id ORDER BY total_salary DESC LIMIT ?'''
+            params = (*month_params, top_n)
+        elif group_by == "designation":
+            query = f'''SELECT COALESCE(NULLIF(TRIM(e.designation), ''), 'Unassigned') AS label,
+                              SUM(p.total_salary) AS total_salary
+                       FROM payroll_totals p LEFT JOIN employees e ON e.employee_id = p.emp_id{month_where}
+                       GROUP BY label ORDER BY total_salary DESC LIMIT ?'''
+            params = (*month_params, top_n)
+        elif group_by == "salary_band":
+            query = f'''SELECT CAST(COALESCE(e.monthly_salary, 0) / ? AS INTEGER) AS band, SUM(p.total_salary) AS total_salary
+                       FROM payroll_totals p LEFT JOIN employees e ON e.employee_id = p.emp_id{month_where}
+                       GROUP BY band ORDER BY band'''
+            params = (band_width, *month_params)
+        else:
+            raise ValueError(f"Unknown payroll grouping: {group_by}")
+        df = pd.read_sql_query(query, conn, params=params)
+        conn.close()
+        if group_by == "salary_band":
+            df["label"] = [f"{int(band * band_width):,}-{int((band + 1) * band_width):,}" for band in df.pop("band")]
+        return df.rename(columns={"label": "Group", "total_salary": "Total Salary"})[["Group", "Total Salary"]]
+
+    def load_attendance(self, month=None):
+        """Load one MM/YYYY payroll month (the latest processed one by default) so totals never span months."""
+        if month is None:
+            months = self.processed_months()
+            month = months[-1] if months else None
+        self.init_db()
+        conn = sqlite3.connect('hr_data.db')
+        where, params = self.payroll_scope(None, [month] if month else None, self.ATT_MONTH_SQL)
+        df = pd.read_sql_query(f"SELECT * FROM attendance{where}", conn, params=params)
+        conn.close()
+        attendance = {"Month/year": month, "Employee ID": {}}
         for _, row in df.iterrows():
             emp_id = row['emp_id']
             if emp_id not in attendance["Employee ID"]:
@@ -303,25 +639,205 @@ class DataManager:
                 "Day": row['day']
             }
             attendance["Employee ID"][emp_id]["total_salary"] += row['salary']
-        employees = self.load_employees()
+        names = {data['employee_id']: name for name, data in self.load_employees().items()}
         for emp_id in attendance["Employee ID"]:
-            attendance["Employee ID"][emp_id]["name"] = next((name for name, data in employees.items() if data['employee_id'] == emp_id), "")
+            attendance["Employee ID"][emp_id]["name"] = names.get(emp_id, "")
         return attendance
 
-    def save_attendance(self, attendance):
+    def processed_months(self):
+        """MM/YYYY months with saved payroll, oldest first."""
+        self.init_db()
+        conn = sqlite3.connect('hr_data.db')
+        months = [row[0] for row in conn.execute("SELECT DISTINCT month FROM payroll_totals")]
+        conn.close()
+        return sorted(months, key=lambda month: (month[3:], month[:2]))
+
+    def save_attendance(self, attendance, months=None):
+        """Replace stored attendance in one transaction; with months, only those MM/YYYY months are replaced."""
         self.init_db()
         conn = sqlite3.connect('hr_data.db')
         c = conn.cursor()
-        c.execute("DELETE FROM attendance")
-        for emp_id, data in attendance["Employee ID"].items():
-            for att_date, att in data["date"].items():
-                c.execute('''INSERT OR REPLACE INTO attendance 
-                             (emp_id, att_date, in_time, out_time, total_hours, status, salary, remark, day) 
-                             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                          (emp_id, att_date, att["In Time"], att["Out Time"], att["Total hours"], att["Status"],
-                           att["Salary"], att["Remark"], att["Day"]))
+        try:
+            if months is None:
+                c.execute("DELETE FROM attendance")
+            else:
+                where, params = self.payroll_scope(None, months, self.ATT_MONTH_SQL)
+                c.execute(f"DELETE FROM attendance{where}", params)
+            for emp_id, data in attendance["Employee ID"].items():
+                for att_date, att in data["date"].items():
+                    c.execute('''INSERT OR REPLACE INTO attendance 
+                                 (emp_id, att_date, in_time, out_time, total_hours, status, salary, remark, day) 
+                                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                              (emp_id, att_date, att["In Time"], att["Out Time"], att["Total hours"], att["Status"],
+                               att["Salary"], att["Remark"], att["Day"]))
+            self.refresh_payroll_totals(c, months=months)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def payroll_scope(self, emp_ids, months, month_expr):
+        """Build a WHERE clause limiting payroll rows to the given employees and MM/YYYY months."""
+        clauses, params = [], []
+        if emp_ids is not None:
+            clauses.append(f"emp_id IN ({', '.join('?' for _ in emp_ids)})")
+            params.extend(emp_ids)
+        if months is not None:
+            clauses.append(f"{month_expr} IN ({', '.join('?' for _ in months)})")
+            params.extend(months)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def refresh_payroll_totals(self, cursor, emp_ids=None, months=None):
+        """Rebuild payroll_totals for the scope from attendance; runs inside the caller's transaction."""
+        where, params = self.payroll_scope(emp_ids, months, "month")
+        cursor.execute(f"DELETE FROM payroll_totals{where}", params)
+        where, params = self.payroll_scope(emp_ids, months, self.ATT_MONTH_SQL)
+        cursor.execute(f'''INSERT INTO payroll_totals (emp_id, month, total_salary)
+                           SELECT emp_id, {self.ATT_MONTH_SQL}, SUM(salary) FROM attendance{where}
+                           GROUP BY emp_id, {self.ATT_MONTH_SQL}''', params)
+
+    def recompute_payroll(self, emp_ids=None, months=None):
+        """Re-apply calculate_salary to stored attendance with one UPDATE, scoped to employees and MM/YYYY months."""
+        if (emp_ids is not None and not emp_ids) or (months is not None and not months):
+            return
+        self.init_db()
+        conn = sqlite3.connect('hr_data.db')
+        c = conn.cursor()
+        factor_case = "CASE status " + " ".join("WHEN ? THEN ?" for _ in self.SALARY_FACTORS) + " ELSE 0 END"
+        factor_params = [value for item in self.SALARY_FACTORS.items() for value in item]
+        where, params = self.payroll_scope(emp_ids, months, self.ATT_MONTH_SQL)
+        try:
+            c.execute(f'''UPDATE attendance SET salary =
+                             COALESCE((SELECT monthly_salary FROM employees WHERE employee_id = attendance.emp_id), 0)
+                             * 1.0 / {self.ATT_DAYS_IN_MONTH_SQL} * {factor_case}{where}''',
+                      factor_params + params)
+            self.refresh_payroll_totals(c, emp_ids, months)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def delete_employee_attendance(self, emp_id):
+        """Remove one employee's attendance and payroll totals without touching anyone else's rows."""
+        self.init_db()
+        conn = sqlite3.connect('hr_data.db')
+        c = conn.cursor()
+        try:
+            c.execute("DELETE FROM attendance WHERE emp_id = ?", (emp_id,))
+            c.execute("DELETE FROM payroll_totals WHERE emp_id = ?", (emp_id,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def update_attendance_status(self, emp_id, att_date, status, remark):
+        """Change one attendance row's status and remark and reprice only that row, in one transaction.
+
+        The row keeps the daily rate its month was already paid at (read back from any paid day), so a
+        salary revision that starts in a later month does not leak into this one.
+        """
+        self.init_db()
+        month = datetime.strptime(att_date, '%Y-%d-%m').strftime('%m/%Y')
+        conn = sqlite3.connect('hr_data.db')
+        c = conn.cursor()
+        try:
+            c.execute(f"SELECT status, salary FROM attendance WHERE emp_id = ? AND {self.ATT_MONTH_SQL} = ?", (emp_id, month))
+            daily_salary = next((salary / self.SALARY_FACTORS[row_status] for row_status, salary in c.fetchall()
+                                 if self.SALARY_FACTORS.get(row_status) and salary), None)
+            if daily_salary is None:
+                # No paid day this month to read the rate from, so price it at the current salary.
+                c.execute("SELECT monthly_salary FROM employees WHERE employee_id = ?", (emp_id,))
+                row = c.fetchone()
+                month_num, year = map(int, month.split('/'))
+                daily_salary = ((row[0] or 0) if row else 0) / self.month_calendar(year, month_num)[0]
+            c.execute("UPDATE attendance SET status = ?, remark = ?, salary = ? WHERE emp_id = ? AND att_date = ?",
+                      (status, remark, self.calculate_salary(status, daily_salary), emp_id, att_date))
+            self.refresh_payroll_totals(c, [emp_id], [month])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def refresh_attendance_salaries(self, attendance, emp_ids):
+        """Pull recomputed salaries for emp_ids from the database into an in-memory attendance dict."""
+        if not emp_ids:
+            return
+        conn = sqlite3.connect('hr_data.db')
+        c = conn.cursor()
+        placeholders = ', '.join('?' for _ in emp_ids)
+        c.execute(f"SELECT emp_id, att_date, salary FROM attendance WHERE emp_id IN ({placeholders})", list(emp_ids))
+        for emp_id, att_date, salary in c.fetchall():
+            emp_data = attendance["Employee ID"].get(emp_id)
+            if emp_data and att_date in emp_data["date"]:
+                emp_data["date"][att_date]["Salary"] = salary
+        where, params = self.payroll_scope(list(emp_ids), [attendance["Month/year"]] if attendance.get("Month/year") else None, "month")
+        c.execute(f"SELECT emp_id, SUM(total_salary) FROM payroll_totals{where} GROUP BY emp_id", params)
+        for emp_id, total_salary in c.fetchall():
+            if emp_id in attendance["Employee ID"]:
+                attendance["Employee ID"][emp_id]["total_salary"] = total_salary
+        conn.close()
+
+    def create_job(self, params):
+        self.init_db()
+        conn = sqlite3.connect('hr_data.db')
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        c = conn.cursor()
+        c.execute("INSERT INTO jobs (status, progress, message, params, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                  ("queued", 0, "", json.dumps(params), now, now))
         conn.commit()
+        job_id = c.lastrowid
+        conn.close()
+        return job_id
+
+    def update_job(self, job_id, status=None, progress=None, message=None, report=None):
+        fields = {"status": status, "progress": progress, "message": message,
+                  "report": json.dumps(report) if report is not None else None}
+        fields = {column: value for column, value in fields.items() if value is not None}
+        fields["updated_at"] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        conn = sqlite3.connect('hr_data.db')
+        conn.execute(f"UPDATE jobs SET {', '.join(f'{column} = ?' for column in fields)} WHERE job_id = ?",
+                     list(fields.values()) + [job_id])
+        conn.commit()
+        conn.close()
+
+    def get_job(self, job_id):
+        conn = sqlite3.connect('hr_data.db')
+        conn.row_factory = sqlite3.Row
+        row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        conn.close()
+        if row is None:
+            return None
+        job = dict(row)
+        job["params"] = json.loads(job["params"]) if job["params"] else {}
+        job["report"] = json.loads(job["report"]) if job["report"] else None
+        return job
+
+    def list_jobs(self, limit=10, statuses=None):
+        self.init_db()
+        conn = sqlite3.connect('hr_data.db')
+        where, params = "", []
+        if statuses:
+            where = f" WHERE status IN ({', '.join('?' for _ in statuses)})"
+            params = list(statuses)
+        df = pd.read_sql_query(f"SELECT job_id, status, progress, message, created_at, updated_at FROM jobs{where} ORDER BY job_id DESC LIMIT ?",
+                               conn, params=params + [limit])
+        conn.close()
+        return df
+
+    def latest_finished_job(self):
+        self.init_db()
+        conn = sqlite3.connect('hr_data.db')
+        row = conn.execute("SELECT MAX(job_id) FROM jobs WHERE status = 'done'").fetchone()
         conn.close()
+        return row[0]
 
     def get_user(self):
         self.init_db()
@@ -393,12 +909,106 @@ class AuthManager:
         except Exception as e:
             st.error(f"Failed to send email: {str(e)}")
 
+class JobRunner:
+    """Runs file ingestion on a background worker thread, persisting job status and progress to SQLite."""
+
+    def __init__(self, data_manager):
+        self.data_manager = data_manager
+        self.queue = queue.Queue()
+        self.data_manager.init_db()
+        conn = sqlite3.connect('hr_data.db')
+        # A job left running belonged to a process that died; its attendance write was never committed.
+        interrupted = conn.execute("SELECT params FROM jobs WHERE status = 'running'").fetchall()
+        conn.execute("UPDATE jobs SET status = 'failed', message = 'Interrupted by a server restart' WHERE status = 'running'")
+        pending = [row[0] for row in conn.execute("SELECT job_id FROM jobs WHERE status = 'queued' ORDER BY job_id")]
+        conn.commit()
+        conn.close()
+        for (params,) in interrupted:
+            self.remove_files(json.loads(params)["files"] if params else [])
+        for job_id in pending:
+            self.queue.put(job_id)
+        self.worker = threading.Thread(target=self.work, name="ingestion-worker", daemon=True)
+        self.worker.start()
+
+    def submit(self, uploaded_files, precedence, period=None):
+        """Copy uploads to disk and queue them as one batch.
+
+        uploaded_files maps source keys to lists of Streamlit UploadedFiles; period is an optional
+        (start_date, end_date) override of the detected payroll months.
+        """
+        files = []
+        for source, source_files in uploaded_files.items():
+            for uploaded_file in source_files or []:
+                with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(uploaded_file.name)[1]) as tmp:
+                    tmp.write(uploaded_file.getvalue())
+                    files.append({"source": source, "name": uploaded_file.name, "path": tmp.name})
+        params = {"files": files, "precedence": precedence,
+                  "period": [date.strftime('%Y-%m-%d') for date in period] if period else None}
+        job_id = self.data_manager.create_job(params)
+        self.queue.put(job_id)
+        return job_id
+
+    def remove_files(self, files):
+        for file in files:
+            if os.path.exists(file["path"]):
+                os.unlink(file["path"])
+
+    def work(self):
+        while True:
+            job_id = self.queue.get()
+            try:
+                self.run_job(job_id)
+            except Exception as e:
+                try:
+                    self.data_manager.update_job(job_id, status="failed", message=str(e))
+                except Exception as update_error:
+                    # Keep the worker alive; a dead thread would leave every later job queued forever.
+                    print(f"Could not record failure of job {job_id}: {update_error}")
+            finally:
+                self.queue.task_done()
+
+    def run_job(self, job_id):
+        job = self.data_manager.get_job(job_id)
+        if job is None or job["status"] != "queued":
+            return
+        files = job["params"]["files"]
+        period = job["params"].get("period")
+        if period:
+            period = tuple(datetime.strptime(date, '%Y-%m-%d') for date in period)
+        self.data_manager.update_job(job_id, status="running", progress=0, message=f"Reading {len(files)} file(s)")
+        report = None
+        try:
+            employees = self.data_manager.load_employees()
+            json_data, months, report = self.data_manager.ingest_files(
+                files, employees, job["params"].get("precedence", "first_in_last_out"),
+                progress=lambda fraction: self.data_manager.update_job(job_id, progress=fraction * 0.9), period=period)
+            if not months:
+                raise ValueError("Could not detect a payroll month in the uploaded files"
+                                 + (f": {'; '.join(report['errors'])}" if report["errors"] else ""))
+            self.data_manager.update_job(job_id, message=f"Saving attendance for {', '.join(months)}")
+            self.data_manager.save_attendance(json_data, months)
+        except Exception:
+            # Keep the per-file errors and match report with the failed job.
+            if report is not None:
+                self.data_manager.update_job(job_id, report=report)
+            raise
+        finally:
+            self.remove_files(files)
+        self.data_manager.update_job(job_id, status="done", progress=1, report=report,
+                                     message=f"Processed period {report['period']}")
+
+@st.cache_resource
+def get_job_runner():
+    """One ingestion worker per server process, shared by every session."""
+    return JobRunner(DataManager())
+
 class UIDashboard:
     """Manages the Streamlit UI and navigation."""
     
-    def __init__(self, data_manager, auth_manager):
+    def __init__(self, data_manager, auth_manager, job_runner):
         self.data_manager = data_manager
         self.auth_manager = auth_manager
+        self.job_runner = job_runner
 
     def setup_ui(self):
         st.set_page_config(page_title="Altius Investech HR Dashboard", layout="wide", page_icon=":office_worker:")
@@ -456,6 +1066,58 @@ class UIDashboard:
             </style>
         """, unsafe_allow_html=True)
 
+    def render_match_report(self, report):
+        st.write(f"Names matched exactly: {len(report['exact'])}, auto-matched: {len(report['auto_matched'])}, unmatched: {len(report['unmatched'])}")
+        if report["auto_matched"] or report["unmatched"]:
+            with st.expander("Name matching report", expanded=bool(report["unmatched"])):
+                if report["auto_matched"]:
+                    st.dataframe(pd.DataFrame([{"Sheet Name": sheet_name, "Matched Employee": emp_name, "Method": method, "Score": score}
+                                               for sheet_name, (emp_name, score, method) in sorted(report["auto_matched"].items())]),
+                                 use_container_width=True)
+                if report["unmatched"]:
+                    st.warning("Skipped, no matching employee: " + ", ".join(sorted(report["unmatched"])))
+
+    def month_label(self, month):
+        return datetime.strptime(month, '%m/%Y').strftime('%B %Y') if month else "None"
+
+    def sync_finished_jobs(self):
+        """Reload attendance once a background job has committed new data."""
+        latest = self.data_manager.latest_finished_job()
+        if latest is not None and latest != st.session_state.get("loaded_job"):
+            st.session_state.attendance = self.data_manager.load_attendance(st.session_state.get("payroll_month"))
+            st.session_state.loaded_job = latest
+            return True
+        return False
+
+    def render_jobs(self):
+        @st.fragment(run_every=2)
+        def job_panel():
+            st.subheader("Processing Jobs")
+            jobs_df = self.data_manager.list_jobs()
+            if jobs_df.empty:
+                st.write("No files processed yet.")
+                return
+            jobs_df = jobs_df.rename(columns={"job_id": "Job", "status": "Status", "progress": "Progress", "message": "Message",
+                                              "created_at": "Submitted", "updated_at": "Updated"})
+            st.dataframe(jobs_df, use_container_width=True, hide_index=True,
+                         column_config={"Progress": st.column_config.ProgressColumn("Progress", min_value=0, max_value=1)})
+            if self.sync_finished_jobs():
+                st.success("Attendance updated from the latest job.")
+            latest = st.session_state.get("loaded_job")
+            if latest is not None:
+                job = self.data_manager.get_job(latest)
+                if job and job["report"]:
+                    st.write(f"Job #{latest}: {job['message']}")
+                    for error in job["report"].get("errors", []):
+                        st.error(error)
+                    self.render_match_report(job["report"])
+        job_panel()
+
+    def employee_picker(self, label, key):
+        """Type-ahead selectbox that only loads the employees matching what has been typed so far."""
+        query = st.text_input("Search", placeholder="Type a name or employee ID", key=f"{key}_query")
+        return st.selectbox(label, options=self.data_manager.search_employees(query), key=key)
+
     def render(self):
         if 'authenticated' not in st.session_state:
             st.session_state.authenticated = False
@@ -521,11 +1183,19 @@ class UIDashboard:
                     selected_tab = st.sidebar.radio("Go to", ["Dashboard Overview", "File Upload", "Employee Management", "Attendance Search", "Reports"])
                     st.sidebar.button("Logout", on_click=lambda: st.session_state.update(authenticated=False))
 
+                    # Everything attendance-related (totals, reports, payment file) is scoped to one payroll month.
+                    payroll_months = self.data_manager.processed_months()
+                    active_month = st.sidebar.selectbox("Payroll month", options=payroll_months[::-1], key="payroll_month",
+                                                        format_func=self.month_label)
+
                     # Initialize session state for data persistence
                     if 'employees' not in st.session_state:
                         st.session_state.employees = self.data_manager.load_employees()
-                    if 'attendance' not in st.session_state:
-                        st.session_state.attendance = self.data_manager.load_attendance()
+                    if 'attendance' not in st.session_state or st.session_state.attendance.get("Month/year") != active_month:
+                        st.session_state.loaded_job = self.data_manager.latest_finished_job()
+                        st.session_state.attendance = self.data_manager.load_attendance(active_month)
+                    else:
+                        self.sync_finished_jobs()
 
                     # Main title with HR dashboard feel
                     st.title("Altius Investech HR Dashboard")
@@ -537,73 +1207,83 @@ class UIDashboard:
                         with col1:
                             st.metric("Total Employees", len(st.session_state.employees))
                         with col2:
-                            st.metric("Processed Months", "July 2025")
+                            st.metric("Payroll Month", self.month_label(active_month),
+                                      help="Processed months: " + (", ".join(payroll_months) or "none"))
                         with col3:
-                            st.metric("Total Salary Processed", sum(data.get("total_salary", 0) for data in st.session_state.attendance.get("Employee ID", {}).values()))
+                            st.metric(f"Total Salary for {self.month_label(active_month)}", sum(data.get("total_salary", 0) for data in st.session_state.attendance.get("Employee ID", {}).values()))
                         st.markdown("---")
                         st.subheader("Attendance Summary")
                         if st.session_state.attendance.get("Employee ID"):
-                            att_df = pd.DataFrame([{"Employee": data["name"], "Total Salary": data["total_salary"]} for data in st.session_state.attendance["Employee ID"].values()])
-                            st.bar_chart(att_df.set_index("Employee"))
+                            col1, col2 = st.columns(2)
+                            with col1:
+                                group_by = st.radio("Group by", options=["employee", "designation", "salary_band"], horizontal=True,
+                                                    format_func={"employee": "Top employees", "designation": "Designation", "salary_band": "Salary band"}.get)
+                            with col2:
+                                top_n = st.slider("Bars to show", min_value=5, max_value=50, value=20, disabled=group_by == "salary_band")
+                            summary_df = self.data_manager.summarize_payroll(group_by, top_n, month=active_month)
+                            st.bar_chart(summary_df.set_index("Group"))
 
                     elif selected_tab == "File Upload":
                         with st.container():
                             st.markdown('<div class="card">', unsafe_allow_html=True)
                             st.header("File Upload")
-                            st.write("Detected Month: 07/2025")
-                            st.write("Upload attendance files for July 1-24, 2025 (GC Office and Merlin Heights).")
+                            st.write("Upload attendance files for GC Office and Merlin Heights. Several months can be uploaded at once; "
+                                     "each is detected from the report and processed as its own payroll month.")
                             col1, col2 = st.columns(2)
                             with col1:
-                                altius_current = st.file_uploader("GC Office (Current Month)", type=["xls", "xlsx"])
-                                altius_prev = st.file_uploader("GC Office (Previous Month)", type=["xls", "xlsx"])
+                                altius_current = st.file_uploader("GC Office (Current Month)", type=["xls", "xlsx"], accept_multiple_files=True)
+                                altius_prev = st.file_uploader("GC Office (Previous Month)", type=["xls", "xlsx"], accept_multiple_files=True)
                             with col2:
-                                monthinout_current = st.file_uploader("Merlin Heights (Current Month)", type=["xls", "xlsx"])
-                                monthinout_prev = st.file_uploader("Merlin Heights (Previous Month)", type=["xls", "xlsx"])
+                                monthinout_current = st.file_uploader("Merlin Heights (Current Month)", type=["xls", "xlsx"], accept_multiple_files=True)
+                                monthinout_prev = st.file_uploader("Merlin Heights (Previous Month)", type=["xls", "xlsx"], accept_multiple_files=True)
+                            period = None
+                            if st.checkbox("Override payroll period"):
+                                col1, col2 = st.columns(2)
+                                with col1:
+                                    period_start = st.date_input("From", value=datetime.now().replace(day=1))
+                                with col2:
+                                    period_end = st.date_input("To", value=datetime.now())
+                                period = (datetime.combine(period_start, datetime.min.time()), datetime.combine(period_end, datetime.min.time()))
+                            precedence = st.selectbox("Overlapping punches", options=list(DataManager.MERGE_STRATEGIES),
+                                                      format_func=DataManager.MERGE_STRATEGIES.get)
                             if st.button("Process Files", key="process_files"):
-                                with st.spinner("Processing files..."):
-                                    start_date = datetime(2025, 7, 1)
-                                    end_date = datetime(2025, 7, 24)
-                                    days_in_month = calendar.monthrange(2025, 7)[1]  # 31
-                                    json_data = {"Month/year": "07/2025", "Employee ID": {}}
-                                    uploaded_files = {
-                                        "altius_current": altius_current,
-                                        "altius_prev": altius_prev,
-                                        "monthinout_current": monthinout_current,
-                                        "monthinout_prev": monthinout_prev
-                                    }
-                                    progress_bar = st.progress(0)
-                                    total_files = sum(1 for f in uploaded_files.values() if f is not None)
-                                    processed = 0
-                                    for file_type, uploaded_file in uploaded_files.items():
-                                        if uploaded_file:
-                                            with tempfile.NamedTemporaryFile(delete=False) as tmp:
-                                                tmp.write(uploaded_file.getvalue())
-                                                file_path = tmp.name
-                                            try:
-                                                engine = 'xlrd' if file_path.endswith('.xls') else 'openpyxl'
-                                                df = pd.read_excel(file_path, engine=engine, header=None)
-                                                self.data_manager.process_excel_file(df, file_path, json_data, file_type.split('_')[0], st.session_state.employees, start_date, end_date, days_in_month)
-                                                processed += 1
-                                                progress_bar.progress(processed / total_files)
-                                            except Exception as e:
-                                                st.error(f"Failed to process {uploaded_file.name}: {e}")
-                                            finally:
-                                                os.unlink(file_path)
-                                    self.data_manager.fill_missing_dates(json_data, start_date, end_date, st.session_state.employees, days_in_month)
-                                    st.session_state.attendance = json_data
-                                    self.data_manager.save_attendance(json_data)
-                                    st.success(f"Files processed for July 2025, period {start_date.strftime('%Y-%d-%m')} to {end_date.strftime('%Y-%d-%m')}")
+                                uploaded_files = {
+                                    "altius_current": altius_current,
+                                    "altius_prev": altius_prev,
+                                    "monthinout_current": monthinout_current,
+                                    "monthinout_prev": monthinout_prev
+                                }
+                                if not any(uploaded_files.values()):
+                                    st.error("Upload at least one file")
+                                elif period and period[0] > period[1]:
+                                    st.error("Period start must be on or before its end")
+                                else:
+                                    job_id = self.job_runner.submit(uploaded_files, precedence, period)
+                                    st.success(f"Queued job #{job_id}. You can keep working while it runs.")
+                            self.render_jobs()
                             st.markdown('</div>', unsafe_allow_html=True)
 
                     elif selected_tab == "Employee Management":
                         with st.container():
                             st.markdown('<div class="card">', unsafe_allow_html=True)
                             st.header("Employee Management")
-                            emp_list = [{"ID": data["employee_id"], "Name": name, "Email": data["email"], "Mobile": data["mobile"],
-                                         "Designation": data["designation"], "Bank Name": data["bank_name"], "Account": data["account_number"],
-                                         "IFSC": data["ifsc"], "Monthly Salary": data["monthly_salary"]} for name, data in st.session_state.employees.items()]
-                            emp_df = pd.DataFrame(emp_list)
-                            st.dataframe(emp_df, use_container_width=True)
+                            col1, col2, col3, col4 = st.columns([3, 2, 1, 1])
+                            with col1:
+                                search = st.text_input("Search", placeholder="Name, ID, email or designation", key="emp_table_search")
+                            with col2:
+                                sort_by = st.selectbox("Sort by", options=list(DataManager.EMPLOYEE_COLUMNS), key="emp_table_sort")
+                            with col3:
+                                page_size = st.selectbox("Rows", options=[25, 50, 100], key="emp_table_page_size")
+                            with col4:
+                                descending = st.checkbox("Descending", key="emp_table_desc")
+                            total = self.data_manager.count_employees(search)
+                            pages = max((total + page_size - 1) // page_size, 1)
+                            if st.session_state.get("emp_table_page", 1) > pages:
+                                st.session_state.emp_table_page = pages
+                            page = st.number_input("Page", min_value=1, max_value=pages, key="emp_table_page")
+                            emp_df = self.data_manager.query_employees(search, sort_by, descending, page_size, (page - 1) * page_size)
+                            st.dataframe(emp_df, use_container_width=True, hide_index=True)
+                            st.caption(f"Page {page} of {pages} ({total} employees)")
                             with st.expander("Add Employee", expanded=False):
                                 with st.form("Add Employee"):
                                     name = st.text_input("Name")
@@ -628,49 +1308,57 @@ class UIDashboard:
                                             st.success("Employee added!")
                                             st.rerun()
                             with st.expander("Modify or Delete Employee", expanded=False):
-                                selected_emp = st.selectbox("Select Employee to Modify", options=[f"{data['employee_id']} - {name}" for name, data in st.session_state.employees.items()])
-                                if selected_emp:
-                                    emp_id = selected_emp.split(" - ")[0]
-                                    old_name = next(name for name, data in st.session_state.employees.items() if data["employee_id"] == emp_id)
+                                selected_emp = self.employee_picker("Select Employee to Modify", "modify_emp")
+                                selected_record = self.data_manager.get_employee(selected_emp.split(" - ", 1)[0]) if selected_emp else None
+                                if selected_record:
+                                    emp_id = selected_emp.split(" - ", 1)[0]
+                                    old_name, old_data = selected_record
                                     with st.form("Modify Employee"):
                                         new_name = st.text_input("Name", value=old_name)
-                                        email = st.text_input("Email", value=st.session_state.employees[old_name]["email"])
-                                        mobile = st.text_input("Mobile", value=st.session_state.employees[old_name]["mobile"])
-                                        designation = st.text_input("Designation", value=st.session_state.employees[old_name]["designation"])
-                                        bank_name = st.text_input("Bank Name", value=st.session_state.employees[old_name]["bank_name"])
-                                        account_number = st.text_input("Account Number", value=st.session_state.employees[old_name]["account_number"])
-                                        ifsc = st.text_input("IFSC", value=st.session_state.employees[old_name]["ifsc"])
-                                        monthly_salary = st.number_input("Monthly Salary", value=st.session_state.employees[old_name]["monthly_salary"])
+                                        email = st.text_input("Email", value=old_data["email"])
+                                        mobile = st.text_input("Mobile", value=old_data["mobile"])
+                                        designation = st.text_input("Designation", value=old_data["designation"])
+                                        bank_name = st.text_input("Bank Name", value=old_data["bank_name"])
+                                        account_number = st.text_input("Account Number", value=old_data["account_number"])
+                                        ifsc = st.text_input("IFSC", value=old_data["ifsc"])
+                                        monthly_salary = st.number_input("Monthly Salary", value=old_data["monthly_salary"])
+                                        effective_month = st.selectbox("Apply salary change from", options=payroll_months,
+                                                                       index=payroll_months.index(active_month) if active_month in payroll_months else None,
+                                                                       help="Processed months from this one onward are repriced; earlier months keep the old salary.")
                                         if st.form_submit_button("Save"):
+                                            # Other sessions may have added or renamed employees since this one loaded.
+                                            st.session_state.employees = self.data_manager.load_employees()
                                             if not new_name:
                                                 st.error("Name cannot be empty")
                                             elif new_name != old_name and new_name in st.session_state.employees:
                                                 st.error("Employee name already exists")
                                             else:
+                                                old_salary = old_data["monthly_salary"]
                                                 updated_data = {
                                                     "employee_id": emp_id, "email": email, "mobile": mobile, "designation": designation,
                                                     "bank_name": bank_name, "account_number": account_number, "ifsc": ifsc, "monthly_salary": monthly_salary
                                                 }
-                                                if new_name != old_name:
-                                                    st.session_state.employees[new_name] = updated_data
-                                                    del st.session_state.employees[old_name]
-                                                    if emp_id in st.session_state.attendance["Employee ID"]:
-                                                        st.session_state.attendance["Employee ID"][emp_id]["name"] = new_name
-                                                else:
-                                                    st.session_state.employees[new_name].update(updated_data)
+                                                st.session_state.employees.pop(old_name, None)
+                                                st.session_state.employees[new_name] = updated_data
+                                                if new_name != old_name and emp_id in st.session_state.attendance["Employee ID"]:
+                                                    st.session_state.attendance["Employee ID"][emp_id]["name"] = new_name
                                                 self.data_manager.save_employees(st.session_state.employees)
-                                                self.data_manager.save_attendance(st.session_state.attendance)
+                                                if monthly_salary != old_salary:
+                                                    revised_months = [month for month in payroll_months
+                                                                      if effective_month and (month[3:], month[:2]) >= (effective_month[3:], effective_month[:2])]
+                                                    self.data_manager.recompute_payroll(emp_ids=[emp_id], months=revised_months)
+                                                    self.data_manager.refresh_attendance_salaries(st.session_state.attendance, [emp_id])
                                                 st.success("Employee modified!")
                                                 st.rerun()
-                                selected_del = st.selectbox("Select Employee to Delete", options=[f"{data['employee_id']} - {name}" for name, data in st.session_state.employees.items()])
+                                selected_del = self.employee_picker("Select Employee to Delete", "delete_emp")
                                 if selected_del and st.button("Delete Employee"):
-                                    emp_id = selected_del.split(" - ")[0]
-                                    name = selected_del.split(" - ")[1]
-                                    del st.session_state.employees[name]
+                                    emp_id = selected_del.split(" - ", 1)[0]
+                                    st.session_state.employees = {name: data for name, data in self.data_manager.load_employees().items()
+                                                                  if data["employee_id"] != emp_id}
                                     if emp_id in st.session_state.attendance["Employee ID"]:
                                         del st.session_state.attendance["Employee ID"][emp_id]
                                     self.data_manager.save_employees(st.session_state.employees)
-                                    self.data_manager.save_attendance(st.session_state.attendance)
+                                    self.data_manager.delete_employee_attendance(emp_id)
                                     st.success("Employee deleted!")
                                     st.rerun()
                             st.markdown('</div>', unsafe_allow_html=True)
@@ -679,7 +1367,7 @@ class UIDashboard:
                         with st.container():
                             st.markdown('<div class="card">', unsafe_allow_html=True)
                             st.header("Attendance Search")
-                            emp_id_name = st.selectbox("Employee ID", options=[f"{data['employee_id']} - {name}" for name, data in st.session_state.employees.items()])
+                            emp_id_name = self.employee_picker("Employee ID", "search_emp")
                             if st.button("Search"):
                                 if emp_id_name:
                                     emp_id = emp_id_name.split(" - ")[0]
@@ -699,7 +1387,6 @@ class UIDashboard:
                             if emp_id_name:
                                 with st.expander("Update Status for Selected Employee"):
                                     emp_id = emp_id_name.split(" - ")[0]
-                                    emp_name = st.session_state.attendance["Employee ID"][emp_id]["name"] if emp_id in st.session_state.attendance["Employee ID"] else ""
                                     date_options = list(st.session_state.attendance["Employee ID"][emp_id]["date"].keys()) if emp_id in st.session_state.attendance["Employee ID"] else []
                                     selected_date = st.selectbox("Select Date to Update", options=date_options)
                                     if selected_date:
@@ -711,15 +1398,11 @@ class UIDashboard:
                                                 if not remark:
                                                     st.error("Remark is required")
                                                 else:
-                                                    days_in_month = calendar.monthrange(2025, 7)[1]
-                                                    daily_salary = st.session_state.employees.get(emp_name, {}).get("monthly_salary", 0) / days_in_month
-                                                    new_salary = self.data_manager.calculate_salary(status, daily_salary)
-                                                    old_salary = current_data["Salary"]
+                                                    self.data_manager.update_attendance_status(emp_id, selected_date, status, remark)
                                                     st.session_state.attendance["Employee ID"][emp_id]["date"][selected_date].update({
-                                                        "Status": status, "Salary": new_salary, "Remark": remark
+                                                        "Status": status, "Remark": remark
                                                     })
-                                                    st.session_state.attendance["Employee ID"][emp_id]["total_salary"] += (new_salary - old_salary)
-                                                    self.data_manager.save_attendance(st.session_state.attendance)
+                                                    self.data_manager.refresh_attendance_salaries(st.session_state.attendance, [emp_id])
                                                     st.success("Status updated!")
                                                     st.rerun()
                             st.markdown('</div>', unsafe_allow_html=True)
@@ -728,6 +1411,7 @@ class UIDashboard:
                         with st.container():
                             st.markdown('<div class="card">', unsafe_allow_html=True)
                             st.header("Reports")
+                            st.write(f"Reports and payment file cover {self.month_label(active_month)}. Change the payroll month in the sidebar.")
                             col1, col2 = st.columns(2)
                             with col1:
                                 if st.button("Generate Attendance Excel"):
@@ -743,7 +1427,7 @@ class UIDashboard:
                                     buffer = io.BytesIO()
                                     wb.save(buffer)
                                     buffer.seek(0)
-                                    st.download_button("Download Attendance Report", buffer, file_name="attendance_report.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+                                    st.download_button("Download Attendance Report", buffer, file_name=f"attendance_report_{(active_month or '').replace('/', '_')}.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
                             with col2:
                                 with st.form("Payment File Options"):
                                     st.subheader("Generate Payment File")
@@ -794,6 +1478,6 @@ class UIDashboard:
 if __name__ == "__main__":
     data_manager = DataManager()
     auth_manager = AuthManager(data_manager)
-    ui_dashboard = UIDashboard(data_manager, auth_manager)
+    ui_dashboard = UIDashboard(data_manager, auth_manager, get_job_runner())
     ui_dashboard.setup_ui()
     ui_dashboard.render()
\ No newline at end of file